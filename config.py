@@ -19,6 +19,14 @@ class Settings:
     LLM_API_KEY = os.getenv("LLM_API_KEY", "")
     LLM_ENDPOINT = os.getenv("LLM_ENDPOINT", "http://localhost:8000/v1")
 
+    # Chart spec cache (identical query + dataset skips the LLM)
+    CHART_SPEC_CACHE_SIZE = 512
+    CHART_SPEC_CACHE_TTL = 600  # seconds
+
+    # Session storage: in-process by default; set REDIS_URL to share sessions across workers
+    REDIS_URL = os.getenv("REDIS_URL", "")
+    SESSION_TTL = 24 * 60 * 60  # seconds
+
     # AWS settings (optional)
     AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
     S3_BUCKET = os.getenv("S3_BUCKET", "")
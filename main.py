@@ -1,11 +1,17 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
+import pandas as pd
 from config import settings
 from routes import data, charts
 
+# Copy-on-write lets the chart pipeline slice dataframes without defensive copies
+pd.options.mode.copy_on_write = True
+
 # Create uploads directory if not exists
 os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 
@@ -16,15 +22,23 @@ async def lifespan(app: FastAPI):
     print(f"Starting {settings.APP_NAME} v{settings.APP_VERSION}")
     print(f"LLM Endpoint: {settings.LLM_ENDPOINT}")
     print(f"CORS Allowed Origins: {settings.ALLOWED_ORIGINS}")
+    # Bounded pool for CPU-bound work offloaded with asyncio.to_thread (chart rendering)
+    executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+    asyncio.get_running_loop().set_default_executor(executor)
+    await data.session_store.connect(settings.REDIS_URL)
     yield
     # Shutdown
     print("Shutting down application")
+    await charts.llm_handler.aclose()
+    await data.session_store.close()
+    executor.shutdown()
 
 # Initialize FastAPI app
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
     description="AI-powered chart generation from natural language",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -40,7 +54,7 @@ app.add_middleware(
 # Global exception handler
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={"detail": "Internal server error", "error": str(exc) if settings.DEBUG else ""}
     )
@@ -86,6 +86,7 @@ class UploadResponse(BaseModel):
 
 class ChartResponse(BaseModel):
     """Response with generated chart"""
+    chart_id: str
     chart_spec: ChartSpecification
-    chart_html: str
+    chart_html: str = ""
     chart_json: Dict[str, Any]
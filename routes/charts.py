@@ -1,35 +1,96 @@
 from fastapi import APIRouter, HTTPException
-from models.schemas import ChartGenerationRequest, ChartResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
+from cachetools import TTLCache
+from typing import Dict, Any
+import asyncio
+import copy
+import hashlib
+from models.schemas import ChartGenerationRequest, ChartResponse, ChartSpecification
 from services.data_handler import data_handler
 from services.llm_handler import create_llm_handler
-from services.chart_generator import chart_generator
+from services.chart_generator import chart_generator, iter_chart_response
 from config import settings
-from routes.data import active_sessions
+from routes.data import session_store
 
 router = APIRouter(prefix="/api/charts", tags=["charts"])
 
+# Shared LLM handler; its connection pool is closed in the app lifespan shutdown
+llm_handler = create_llm_handler(
+    endpoint=settings.LLM_ENDPOINT,
+    api_key=settings.LLM_API_KEY,
+    model=settings.LLM_MODEL
+)
+
+# LLM parses currently in flight, keyed by request fingerprint, so identical
+# concurrent queries share one call; specs that rendered are kept for a short while
+_pending_specs: Dict[str, asyncio.Future] = {}
+_spec_cache = TTLCache(maxsize=settings.CHART_SPEC_CACHE_SIZE, ttl=settings.CHART_SPEC_CACHE_TTL)
+
+def _spec_key(session_id: str, user_query: str, metadata_hash: str) -> str:
+    """Fingerprint a chart request by query, session and data metadata"""
+    return hashlib.sha256(f"{user_query}\0{session_id}\0{metadata_hash}".encode()).hexdigest()
+
+async def _parse_chart_spec(key: str, user_query: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Parse a user query, coalescing identical concurrent requests into one LLM call.
+    Results are not cached here; generate_chart caches a spec once it has rendered.
+    """
+    while True:
+        cached = _spec_cache.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
+        pending = _pending_specs.get(key)
+        if pending is None:
+            break
+        try:
+            # Shield so a disconnecting follower does not cancel the shared call
+            return copy.deepcopy(await asyncio.shield(pending))
+        except asyncio.CancelledError:
+            # Only the leader was cancelled, not this request: retry, taking over the call
+            if not pending.cancelled():
+                raise
+
+    future = asyncio.get_running_loop().create_future()
+    _pending_specs[key] = future
+    try:
+        chart_spec = await llm_handler.parse_user_request(user_query, metadata)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Mark as retrieved so asyncio does not log it when no follower is waiting
+        future.exception()
+        raise
+    else:
+        future.set_result(chart_spec)
+    finally:
+        del _pending_specs[key]
+
+    return copy.deepcopy(chart_spec)
+
 @router.post("/generate/{session_id}", response_model=ChartResponse)
-async def generate_chart(session_id: str, request: ChartGenerationRequest):
-    """Generate chart from natural language query"""
+async def generate_chart(session_id: str, request: ChartGenerationRequest, include_html: bool = False):
+    """Generate chart from natural language query
+
+    The body is streamed as it is serialized. `chart_html` is only rendered
+    with `?include_html=true`; otherwise fetch it later from the
+    `/{session_id}/{chart_id}/html` endpoint.
+    """
 
     # Validate session
-    if session_id not in active_sessions:
+    session = await session_store.get(session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    session = active_sessions[session_id]
     df = session['dataframe']
     metadata = session['metadata']
 
     try:
-        # Initialize LLM handler
-        llm_handler = create_llm_handler(
-            endpoint=settings.LLM_ENDPOINT,
-            api_key=settings.LLM_API_KEY,
-            model=settings.LLM_MODEL
-        )
-
         # Parse user query and get chart specification
-        chart_spec = await llm_handler.parse_user_request(request.user_query, metadata)
+        key = _spec_key(session_id, request.user_query, session['metadata_hash'])
+        chart_spec = await _parse_chart_spec(key, request.user_query, metadata)
 
         # Validate specification against data
         for col_name in [chart_spec.get('x_axis'), chart_spec.get('y_axis'), chart_spec.get('color_by')]:
@@ -37,15 +98,60 @@ async def generate_chart(session_id: str, request: ChartGenerationRequest):
                 raise ValueError(f"Column '{col_name}' not found in data")
 
         # Generate the chart
-        result = await chart_generator.generate_chart(df, chart_spec)
+        result = await chart_generator.generate_chart(
+            df,
+            chart_spec,
+            include_html=include_html,
+            numeric_cols=session['numeric_cols'],
+            session_id=session_id,
+            data_hash=session['metadata_hash'],
+        )
+
+        # Validate the spec and stream its normalized form, as response_model would;
+        # the figure is serialized chunk by chunk
+        result['chart_spec'] = ChartSpecification(**result['chart_spec']).model_dump(mode='json')
+        # Only specs that validated and rendered are reused; a failed query goes back to the LLM
+        _spec_cache[key] = chart_spec
+        # Any worker can rebuild the chart's HTML page from the stored spec
+        await session_store.add_chart(session_id, result['chart_id'], chart_spec)
+        return StreamingResponse(iter_chart_response(result), media_type="application/json")
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating chart: {str(e)}")
+
+@router.get("/{session_id}/{chart_id}/html", response_class=HTMLResponse)
+async def get_chart_html(session_id: str, chart_id: str):
+    """Standalone HTML page for a chart generated earlier in the session"""
+    # The render cache is per worker and outlives sessions deleted or expired elsewhere
+    if not await session_store.exists(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
 
-        # Validate/serialize into the Pydantic response model to ensure proper shape
-        return ChartResponse(**result)
+    html = await chart_generator.get_chart_html(session_id, chart_id)
+    if html is not None:
+        return HTMLResponse(html)
 
+    # Not rendered by this worker (or evicted): rebuild it from the session's stored spec
+    session = await session_store.get(session_id)
+    chart_spec = await session_store.get_chart(session_id, chart_id) if session is not None else None
+    if chart_spec is None:
+        raise HTTPException(status_code=404, detail="Chart not found")
+
+    try:
+        result = await chart_generator.generate_chart(
+            session['dataframe'],
+            chart_spec,
+            include_html=True,
+            numeric_cols=session['numeric_cols'],
+            session_id=session_id,
+            data_hash=session['metadata_hash'],
+        )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating chart: {str(e)}")
+    return HTMLResponse(result['chart_html'])
 
 @router.get("/supported-types")
 async def get_supported_chart_types():
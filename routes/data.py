@@ -1,18 +1,30 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from fastapi.responses import JSONResponse
+import os
 import uuid
+import hashlib
+from typing import Optional
 from config import settings
 from services.data_handler import data_handler
+from services.chart_generator import chart_generator
+from services.session_store import SessionStore
 from models.schemas import UploadResponse, DataMetadata
 
 router = APIRouter(prefix="/api/data", tags=["data"])
 
-# In-memory store for session data (use Redis/database in production)
-active_sessions = {}
+# Session data; in process memory unless connected to Redis in the app lifespan
+session_store = SessionStore(ttl=settings.SESSION_TTL)
 
-@router.post("/upload/{session_id}")
-async def upload_data(session_id: str, file: UploadFile = File(...)) -> UploadResponse:
-    """Upload and validate CSV/JSON/Excel file"""
+def _upload_size(file: UploadFile) -> int:
+    """Size in bytes of an uploaded file, which Starlette has already spooled to a temp file"""
+    if file.size is None:
+        file.file.seek(0, os.SEEK_END)
+        file.size = file.file.tell()
+    file.file.seek(0)
+    return file.size
+
+async def _ingest_upload(file: UploadFile, session_id: Optional[str] = None) -> UploadResponse:
+    """Validate, parse and analyze an upload, then store it under `session_id` (a new one if None)"""
     try:
         # Validate file type
         file_extension = file.filename.split('.')[-1].lower()
@@ -22,16 +34,15 @@ async def upload_data(session_id: str, file: UploadFile = File(...)) -> UploadRe
                 detail=f"Unsupported file type. Allowed: {settings.ALLOWED_FILE_TYPES}"
             )
 
-        # Validate file size
-        content = await file.read()
-        if len(content) > settings.MAX_UPLOAD_SIZE:
+        # Validate file size without reading the upload into memory
+        if _upload_size(file) > settings.MAX_UPLOAD_SIZE:
             raise HTTPException(
                 status_code=413,
                 detail=f"File too large. Maximum size: {settings.MAX_UPLOAD_SIZE} bytes"
             )
 
-        # Load and validate data
-        df = await data_handler.load_data(content, file_extension)
+        # Load and validate data, parsing straight from the spooled upload file
+        df = await data_handler.load_data(file.file, file_extension)
 
         # Validate data structure
         is_valid, message = data_handler.validate_data(df)
@@ -41,20 +52,27 @@ async def upload_data(session_id: str, file: UploadFile = File(...)) -> UploadRe
         # Analyze data structure
         metadata = data_handler.analyze_data_structure(df)
 
-        # Store in session
-        active_sessions[session_id] = {
+        # Store in session, creating one if needed
+        if session_id is None:
+            session_id = str(uuid.uuid4())
+        await session_store.set(session_id, {
             'dataframe': df,
             'filename': file.filename,
             'metadata': metadata,
-        }
-
-        return UploadResponse(
+            # Precomputed once, reused by every chart request on this session
+            'metadata_hash': hashlib.blake2b(repr(metadata).encode(), digest_size=16).hexdigest(),
+            'numeric_cols': frozenset(metadata['numerical_columns']),
+        })
+        chart_generator.invalidate_session(session_id)
+
+        # Built from data we just computed, so skip validation
+        return UploadResponse.model_construct(
             session_id=session_id,
             filename=file.filename,
             row_count=len(df),
             column_count=len(df.columns),
             columns=list(df.columns),
-            metadata=DataMetadata(**metadata)
+            metadata=DataMetadata.model_construct(**metadata)
         )
 
     except HTTPException:
@@ -62,67 +80,26 @@ async def upload_data(session_id: str, file: UploadFile = File(...)) -> UploadRe
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing file: {str(e)}")
 
-@router.post("/upload")
+# response_model=None: the response is built with model_construct and must not be re-validated
+@router.post("/upload/{session_id}", response_model=None, responses={200: {"model": UploadResponse}})
+async def upload_data(session_id: str, file: UploadFile = File(...)) -> UploadResponse:
+    """Upload and validate CSV/JSON/Excel file"""
+    return await _ingest_upload(file, session_id)
+
+@router.post("/upload", response_model=None, responses={200: {"model": UploadResponse}})
 async def upload_data_legacy(file: UploadFile = File(...)) -> UploadResponse:
     """Legacy endpoint: Upload and validate CSV/JSON/Excel file (for backwards compatibility)"""
-    try:
-        # Validate file type
-        file_extension = file.filename.split('.')[-1].lower()
-        if file_extension not in settings.ALLOWED_FILE_TYPES:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unsupported file type. Allowed: {settings.ALLOWED_FILE_TYPES}"
-            )
-
-        # Validate file size
-        content = await file.read()
-        if len(content) > settings.MAX_UPLOAD_SIZE:
-            raise HTTPException(
-                status_code=413,
-                detail=f"File too large. Maximum size: {settings.MAX_UPLOAD_SIZE} bytes"
-            )
-
-        # Load and validate data
-        df = await data_handler.load_data(content, file_extension)
-
-        # Validate data structure
-        is_valid, message = data_handler.validate_data(df)
-        if not is_valid:
-            raise HTTPException(status_code=400, detail=message)
-
-        # Analyze data structure
-        metadata = data_handler.analyze_data_structure(df)
-
-        # Create session
-        session_id = str(uuid.uuid4())
-        active_sessions[session_id] = {
-            'dataframe': df,
-            'filename': file.filename,
-            'metadata': metadata,
-        }
-
-        return UploadResponse(
-            session_id=session_id,
-            filename=file.filename,
-            row_count=len(df),
-            column_count=len(df.columns),
-            columns=list(df.columns),
-            metadata=DataMetadata(**metadata)
-        )
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error processing file: {str(e)}")
+    return await _ingest_upload(file)
 
 @router.get("/sessions/{session_id}")
 async def get_session_info(session_id: str):
     """Get information about a session"""
-    if session_id not in active_sessions:
+    session = await session_store.get(session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    session = active_sessions[session_id]
-    metadata = session['metadata']
+    # Underscore keys are internal (e.g. the pre-serialized prompt fragments)
+    metadata = {k: v for k, v in session['metadata'].items() if not k.startswith('_')}
 
     return {
         "session_id": session_id,
@@ -136,8 +113,8 @@ async def get_session_info(session_id: str):
 @router.delete("/sessions/{session_id}")
 async def delete_session(session_id: str):
     """Delete a session and free memory"""
-    if session_id not in active_sessions:
+    if not await session_store.delete(session_id):
         raise HTTPException(status_code=404, detail="Session not found")
 
-    del active_sessions[session_id]
+    chart_generator.invalidate_session(session_id)
     return {"message": f"Session {session_id} deleted"}
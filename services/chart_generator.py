@@ -1,13 +1,123 @@
-import plotly.graph_objects as go
-import plotly.express as px
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import zlib
 import pandas as pd
-import json
-from typing import Dict, Any, List, Tuple
+import numpy as np
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+from cachetools import LRUCache
+from functools import cache
+from typing import TYPE_CHECKING, Dict, Any, FrozenSet, Iterator, List, Optional, Tuple
+
+from services.data_handler import FILTER_OPS, column_mask
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+# Pie charts keep only the most frequent categories
+MAX_PIE_SLICES = 50
+
+# Scatter/line/area charts are downsampled to about this many points
+DOWNSAMPLE_TARGET = 5000
+
+@cache
+def _px():
+    """Import plotly.express on first use; it is slow to load and only chart rendering needs it"""
+    import plotly.express as px
+    return px
+
+def _lttb_indices(x: np.ndarray, y: np.ndarray, target: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: positions of `target` points that keep
+    the visual shape of the line through (x, y)
+    """
+    n = len(x)
+    if target >= n or target < 3:
+        return np.arange(n)
+
+    # First and last points are kept; the rest is split into target - 2 buckets
+    edges = np.linspace(1, n - 1, target - 1).astype(np.int64)
+    bucket_starts = edges[:-1]
+    bucket_ends = edges[1:]
+    # Mean of each bucket from prefix sums, plus the last point as a final "bucket"
+    cum_x = np.concatenate(([0.0], np.cumsum(x)))
+    cum_y = np.concatenate(([0.0], np.cumsum(y)))
+    sizes = bucket_ends - bucket_starts
+    mean_x = np.append((cum_x[bucket_ends] - cum_x[bucket_starts]) / sizes, x[-1])
+    mean_y = np.append((cum_y[bucket_ends] - cum_y[bucket_starts]) / sizes, y[-1])
+
+    selected = np.empty(target, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(target - 2):
+        start, end = bucket_starts[i], bucket_ends[i]
+        # Pick the point forming the largest triangle with the previous pick and the next bucket's mean
+        area = np.abs(
+            (x[a] - mean_x[i + 1]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (mean_y[i + 1] - y[a])
+        )
+        a = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        selected[i + 1] = a
+    return selected
+
+def _json_default(obj: Any) -> Any:
+    """Convert values orjson cannot serialize natively (Plotly figure dicts keep NumPy/pandas objects)"""
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps_json(obj: Any) -> bytes:
+    """Serialize chart output to JSON bytes with orjson"""
+    return orjson.dumps(obj, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+@cache
+def _html_template() -> str:
+    """Standalone chart page, built once; takes the figure JSON"""
+    from plotly.offline import get_plotlyjs_version
+    return (
+        '<html>\n<head><meta charset="utf-8" /></head>\n<body>\n'
+        '<div id="chart" class="plotly-graph-div" style="height:100%%; width:100%%;"></div>\n'
+        f'<script charset="utf-8" src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"></script>\n'
+        '<script type="text/javascript">var fig = %s; var div = document.getElementById("chart");\n'
+        'if (fig.layout && fig.layout.height) { div.style.height = fig.layout.height + "px"; }\n'
+        'Plotly.newPlot(div, fig.data, fig.layout, {"responsive": true});</script>\n'
+        '</body>\n</html>'
+    )
+
+def render_chart_html(chart_json: bytes) -> str:
+    """Render serialized figure JSON as a standalone HTML page, without going through fig.to_html"""
+    # Keep "</script>" inside strings from closing the script tag
+    return _html_template() % chart_json.replace(b'</', b'<\\/').decode()
+
+def iter_chart_response(result: Dict[str, Any]) -> Iterator[bytes]:
+    """Yield a generate_chart result as a JSON document; the figure is already serialized"""
+    yield b'{"chart_id":' + dumps_json(result['chart_id'])
+    yield b',"chart_spec":' + dumps_json(result['chart_spec'])
+    yield b',"chart_json":'
+    yield result['chart_json']
+    yield b',"chart_html":' + dumps_json(result['chart_html']) + b'}'
+
+def _cached_size(entry: Dict[str, Any]) -> int:
+    """Bytes held by a render cache entry"""
+    return len(entry['chart_json']) + len(entry['chart_html'] or b'')
 
 class ChartGenerator:
     """Generates interactive charts using Plotly"""
 
-    def __init__(self):
+    def __init__(self, cache_bytes: int = 64 * 1024 * 1024):
+        # Rendered charts by (session_id, chart_id).
+        # Entries hold compressed JSON/HTML bytes, and the cache is bounded by their total size
+        self._render_cache = LRUCache(maxsize=cache_bytes, getsizeof=_cached_size)
         self.chart_functions = {
             'bar': self._create_bar_chart,
             'line': self._create_line_chart,
@@ -32,14 +142,19 @@ class ChartGenerator:
         if not cols_available:
             raise ValueError(f"None of the required columns {columns_needed} found in data. Available: {list(df.columns)}")
         
-        # Select only needed columns
-        df_prep = df[cols_available].copy()
+        # Select only needed columns (copy-on-write, so no explicit copy)
+        df_prep = df.loc[:, cols_available]
         
         # Remove completely empty columns
         df_prep = df_prep.dropna(axis=1, how='all')
         
         # Remove rows where all values are NaN
         df_prep = df_prep.dropna(how='all')
+
+        # Plotly groups categoricals without observed=True; hand it plain values
+        for col, dtype in df_prep.dtypes.items():
+            if isinstance(dtype, pd.CategoricalDtype):
+                df_prep[col] = df_prep[col].astype(object)
         
         if numeric_only:
             # Keep only numeric columns
@@ -76,6 +191,67 @@ class ChartGenerator:
         except Exception as e:
             raise ValueError(f"Cannot convert column '{column}' to numeric: {str(e)}")
 
+    def _value_counts(self, df: pd.DataFrame, column: str) -> pd.DataFrame:
+        """
+        Count each non-null value of a column, most frequent first,
+        as a two-column frame: [column, 'count']
+        """
+        try:
+            counts = pc.value_counts(pc.drop_null(pa.array(df[column])))
+        except pa.ArrowException:
+            # Mixed-type object columns cannot be converted to Arrow
+            return df[column].value_counts().rename_axis(column).reset_index(name='count')
+
+        counts_df = pd.DataFrame({
+            column: counts.field('values').to_pandas(),
+            'count': counts.field('counts').to_pandas(),
+        })
+        return counts_df.sort_values('count', ascending=False, kind='stable', ignore_index=True)
+
+    def _maybe_downsample(
+        self,
+        df: pd.DataFrame,
+        chart_type: str,
+        x_axis: str,
+        y_axis: str,
+        color_by: Optional[str] = None,
+        target: int = DOWNSAMPLE_TARGET,
+    ) -> pd.DataFrame:
+        """
+        Reduce large frames before plotting: a seeded random sample for scatter,
+        LTTB per color group for line/area so peaks and troughs survive
+        """
+        if len(df) <= target:
+            return df
+
+        if chart_type == 'scatter':
+            return df.sample(n=target, random_state=0).sort_index()
+
+        y = df[y_axis]
+        if not pd.api.types.is_numeric_dtype(y):
+            # Nothing to rank triangles by; keep evenly spaced rows
+            return df.iloc[np.linspace(0, len(df) - 1, target).astype(np.int64)]
+        y = y.to_numpy(dtype=np.float64, na_value=np.nan)
+
+        x = df[x_axis]
+        if pd.api.types.is_datetime64_any_dtype(x):
+            x = x.to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(np.float64)
+        elif pd.api.types.is_numeric_dtype(x):
+            x = x.to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            x = np.arange(len(df), dtype=np.float64)
+
+        if color_by and color_by in df.columns:
+            groups = df.groupby(color_by, sort=False, observed=True, dropna=False).indices.values()
+        else:
+            groups = [np.arange(len(df))]
+
+        keep = [
+            idx[_lttb_indices(x[idx], y[idx], max(3, target * len(idx) // len(df)))]
+            for idx in groups
+        ]
+        return df.iloc[np.sort(np.concatenate(keep))]
+
     def _get_columns_for_chart(self, spec: Dict[str, Any]) -> List[str]:
         """
         Extract all columns needed for a chart from spec
@@ -89,8 +265,95 @@ class ChartGenerator:
             cols.append(spec['color_by'])
         return cols
 
-    async def generate_chart(self, df: pd.DataFrame, chart_spec: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate chart based on specification"""
+    async def generate_chart(
+        self,
+        df: pd.DataFrame,
+        chart_spec: Dict[str, Any],
+        include_html: bool = True,
+        numeric_cols: Optional[FrozenSet[str]] = None,
+        session_id: Optional[str] = None,
+        data_hash: str = '',
+    ) -> Dict[str, Any]:
+        """Generate chart based on specification
+
+        `numeric_cols` are the numeric columns of `df` precomputed at upload;
+        chart functions use them instead of rescanning dtypes.
+        The result's `chart_id` identifies the spec and data version
+        (`data_hash`), and its `chart_json` is the serialized figure; when
+        `session_id` is given, results are cached under it, and
+        get_chart_html() can render the page later.
+        """
+        spec_bytes = orjson.dumps(chart_spec, option=orjson.OPT_SORT_KEYS)
+        chart_id = hashlib.blake2b(data_hash.encode() + b'\0' + spec_bytes, digest_size=8).hexdigest()
+        if session_id is not None:
+            cached = self._render_cache.get((session_id, chart_id))
+            if cached is not None:
+                # A page missing from the cache is built from the cached figure, not re-rendered
+                html = await self.get_chart_html(session_id, chart_id) if include_html else ''
+                return {
+                    'chart_id': chart_id,
+                    'chart_spec': chart_spec,
+                    'chart_html': html,
+                    'chart_json': await asyncio.to_thread(zlib.decompress, cached['chart_json']),
+                }
+
+        def render():
+            result = self._render_chart(df, chart_spec, include_html, numeric_cols)
+            if session_id is None:
+                return result, None
+            return result, {
+                'chart_json': zlib.compress(result['chart_json'], 1),
+                'chart_html': zlib.compress(result['chart_html'].encode(), 1) if include_html else None,
+            }
+
+        # pandas/Plotly work and cache encoding are CPU-bound; run them off the event loop
+        result, entry = await asyncio.to_thread(render)
+        result['chart_id'] = chart_id
+
+        if entry is not None:
+            # A chart larger than the whole cache is served but not kept
+            if _cached_size(entry) <= self._render_cache.maxsize:
+                self._render_cache[(session_id, chart_id)] = entry
+        return result
+
+    async def get_chart_html(self, session_id: str, chart_id: str) -> Optional[str]:
+        """HTML page of a chart already generated for the session, or None if it is not cached"""
+        cached = self._render_cache.get((session_id, chart_id))
+        if cached is None:
+            return None
+        if cached['chart_html'] is not None:
+            return (await asyncio.to_thread(zlib.decompress, cached['chart_html'])).decode()
+
+        def render():
+            html = render_chart_html(zlib.decompress(cached['chart_json']))
+            return html, zlib.compress(html.encode(), 1)
+
+        html, packed = await asyncio.to_thread(render)
+        entry = {'chart_json': cached['chart_json'], 'chart_html': packed}
+        # Reinsert rather than mutate, so the cache accounts for the added bytes
+        if _cached_size(entry) <= self._render_cache.maxsize:
+            self._render_cache[(session_id, chart_id)] = entry
+        return html
+
+    def invalidate_session(self, session_id: str) -> None:
+        """Drop cached charts of a session whose data was replaced or deleted"""
+        # Keys come from the cache itself, so evicted entries leave nothing behind
+        for key in [key for key in self._render_cache if key[0] == session_id]:
+            self._render_cache.pop(key, None)
+
+    def _render_chart(
+        self,
+        df: pd.DataFrame,
+        chart_spec: Dict[str, Any],
+        include_html: bool,
+        numeric_cols: Optional[FrozenSet[str]],
+    ) -> Dict[str, Any]:
+        """Filter, aggregate and plot the data; blocking counterpart of generate_chart"""
+        # Bad filters are request errors; raise them as ValueError, outside the generic wrapper below
+        filtered_df = self._apply_filters(df, chart_spec.get('filters'))
+        if filtered_df.empty and not df.empty:
+            raise ValueError("No data matches the specified filters")
+
         try:
             chart_type = chart_spec.get('chart_type', '').lower()
 
@@ -100,23 +363,6 @@ class ChartGenerator:
             if df.empty:
                 raise ValueError("Input dataframe is empty")
 
-            # Apply filters if specified
-            filtered_df = df.copy()
-            if chart_spec.get('filters'):
-                for filter_item in chart_spec['filters']:
-                    column = filter_item.get('column')
-                    operator = filter_item.get('operator')
-                    value = filter_item.get('value')
-
-                    if not column or column not in filtered_df.columns:
-                        continue
-                    
-                    if operator == '==':
-                        filtered_df = filtered_df[filtered_df[column] == value]
-
-            if filtered_df.empty:
-                raise ValueError("No data matches the specified filters")
-
             # Apply aggregation if requested and y_axis provided
             agg = chart_spec.get('aggregation', 'none')
             x_axis = chart_spec.get('x_axis')
@@ -126,6 +372,8 @@ class ChartGenerator:
             if agg and agg != 'none' and y_axis and x_axis:
                 try:
                     filtered_df = self._apply_aggregation(filtered_df, agg, x_axis, y_axis, color_by)
+                    # Aggregated columns may change dtype, so the upload-time list no longer applies
+                    numeric_cols = None
                 except Exception as e:
                     print(f"Warning: Aggregation failed ({str(e)}), proceeding without aggregation")
 
@@ -138,21 +386,59 @@ class ChartGenerator:
 
             # Generate the appropriate chart
             chart_function = self.chart_functions[chart_type]
-            fig = chart_function(filtered_df, chart_spec)
+            render_spec = {**chart_spec, '_numeric_cols': numeric_cols}
+            fig = chart_function(filtered_df, render_spec)
 
             # Apply customizations
             customization = chart_spec.get('customization', {})
             fig = self._apply_customizations(fig, customization)
 
-            # Return chart in multiple formats
+            # Return chart in multiple formats; the figure is serialized once, here on the
+            # worker thread, and those bytes are cached, streamed and embedded in the page
+            chart_json = dumps_json(fig.to_plotly_json())
             return {
                 'chart_spec': chart_spec,
-                'chart_html': fig.to_html(include_plotlyjs='cdn'),
-                'chart_json': json.loads(fig.to_json()),
+                'chart_html': render_chart_html(chart_json) if include_html else '',
+                'chart_json': chart_json,
             }
         except Exception as e:
             raise Exception(f"Error generating {chart_spec.get('chart_type', 'unknown')} chart: {str(e)}")
 
+    def _apply_filters(self, df: pd.DataFrame, filters: Optional[List[Dict[str, Any]]]) -> pd.DataFrame:
+        """Apply spec filters: build all masks, then index the frame once. Unknown columns/operators are skipped"""
+        if not filters:
+            return df
+
+        masks = []
+        for filter_item in filters:
+            column = filter_item.get('column')
+            op_func = FILTER_OPS.get(filter_item.get('operator'))
+
+            if not column or column not in df.columns or op_func is None:
+                continue
+
+            value = self._coerce_filter_value(df[column], filter_item.get('value'))
+            try:
+                masks.append(column_mask(df[column], op_func, value))
+            except TypeError as e:
+                raise ValueError(f"Cannot apply filter on '{column}': {str(e)}")
+
+        return df[np.logical_and.reduce(masks)] if masks else df
+
+    def _coerce_filter_value(self, col: pd.Series, value: Any) -> Any:
+        """Convert a string filter value (LLMs often quote numbers and dates) to the column's kind"""
+        if not isinstance(value, str):
+            return value
+        dtype = col.dtype.categories.dtype if isinstance(col.dtype, pd.CategoricalDtype) else col.dtype
+        try:
+            if pd.api.types.is_datetime64_any_dtype(dtype):
+                return pd.Timestamp(value)
+            if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+                return pd.to_numeric(value)
+        except ValueError:
+            raise ValueError(f"Filter value {value!r} does not match the type of column '{col.name}'")
+        return value
+
     def _apply_aggregation(self, df: pd.DataFrame, agg: str, x_axis: str, y_axis: str, color_by: str = None) -> pd.DataFrame:
         """Apply aggregation to dataframe"""
         agg_map = {
@@ -173,21 +459,50 @@ class ChartGenerator:
             raise ValueError(f"Y-axis column '{y_axis}' not found")
 
         # If color_by present, aggregate per (x_axis, color_by)
-        if color_by and color_by in df.columns:
-            grouped = df.groupby([x_axis, color_by])[y_axis]
-            if func == 'count':
-                agg_df = grouped.size().reset_index(name=y_axis)
-            else:
-                agg_df = grouped.aggregate(func).reset_index()
+        keys = [x_axis]
+        if color_by and color_by in df.columns and color_by not in keys:
+            keys.append(color_by)
+
+        # Arrow on pyarrow 14 can't sort or multi-key group dictionary (categorical) columns;
+        # pandas' observed=True groupby already works on their integer codes
+        use_arrow = y_axis not in keys and not any(
+            isinstance(df[col].dtype, pd.CategoricalDtype) for col in (*keys, y_axis)
+        )
+        if use_arrow:
+            try:
+                return self._arrow_aggregate(df, func, keys, y_axis)
+            except pa.ArrowException:
+                # Mixed-type object columns etc. that Arrow can't take; use pandas
+                pass
+
+        grouped = df.groupby(keys, observed=True)[y_axis]
+        if func == 'count':
+            agg_df = grouped.size().reset_index(name=y_axis)
         else:
-            grouped = df.groupby(x_axis)[y_axis]
-            if func == 'count':
-                agg_df = grouped.size().reset_index(name=y_axis)
-            else:
-                agg_df = grouped.aggregate(func).reset_index()
+            agg_df = grouped.aggregate(func).reset_index()
 
         return agg_df
 
+    def _arrow_aggregate(self, df: pd.DataFrame, func: str, keys: List[str], y_axis: str) -> pd.DataFrame:
+        """Hash-aggregate with Arrow's multithreaded group_by, matching pandas' sorted, null-key-free output"""
+        table = pa.Table.from_pandas(df.loc[:, [*keys, y_axis]], preserve_index=False)
+        # pandas drops groups whose key is null/NaN
+        valid = pc.and_(*[pc.is_valid(table[k]) for k in keys]) if len(keys) > 1 else pc.is_valid(table[keys[0]])
+        table = table.filter(valid)
+
+        if func == 'count':
+            # pandas counts rows (size), nulls included
+            result = table.group_by(keys).aggregate([([], 'count_all')])
+            result = result.rename_columns([y_axis if name == 'count_all' else name for name in result.column_names])
+        else:
+            # min_count=0 so an all-null group sums to 0 like pandas
+            options = pc.ScalarAggregateOptions(min_count=0) if func == 'sum' else None
+            result = table.group_by(keys).aggregate([(y_axis, func, options)])
+            result = result.rename_columns([y_axis if name == f"{y_axis}_{func}" else name for name in result.column_names])
+
+        result = result.sort_by([(k, 'ascending') for k in keys])
+        return result.select([*keys, y_axis]).to_pandas()
+
     def _create_bar_chart(self, df: pd.DataFrame, spec: Dict[str, Any]) -> go.Figure:
         """Create bar chart"""
         x_axis = spec.get('x_axis')
@@ -201,7 +516,7 @@ class ChartGenerator:
             if y_axis:
                 # Numeric bar chart
                 plot_df = self._prepare_data(df, [x_axis, y_axis])
-                fig = px.bar(
+                fig = _px().bar(
                     plot_df,
                     x=x_axis,
                     y=y_axis,
@@ -212,9 +527,8 @@ class ChartGenerator:
             else:
                 # Count bar chart
                 plot_df = self._prepare_data(df, [x_axis])
-                counts = plot_df[x_axis].value_counts().reset_index()
-                counts.columns = [x_axis, 'count']
-                fig = px.bar(
+                counts = self._value_counts(plot_df, x_axis)
+                fig = _px().bar(
                     counts,
                     x='count',
                     y=x_axis,
@@ -241,8 +555,9 @@ class ChartGenerator:
                 cols_needed.append(color_by)
             
             plot_df = self._prepare_data(df, cols_needed)
+            plot_df = self._maybe_downsample(plot_df, 'line', x_axis, y_axis, color_by)
             
-            fig = px.line(
+            fig = _px().line(
                 plot_df,
                 x=x_axis,
                 y=y_axis,
@@ -270,8 +585,9 @@ class ChartGenerator:
                 cols_needed.append(color_by)
             
             plot_df = self._prepare_data(df, cols_needed)
+            plot_df = self._maybe_downsample(plot_df, 'scatter', x_axis, y_axis)
             
-            fig = px.scatter(
+            fig = _px().scatter(
                 plot_df,
                 x=x_axis,
                 y=y_axis,
@@ -292,9 +608,9 @@ class ChartGenerator:
 
         try:
             plot_df = self._prepare_data(df, [x_axis])
-            pie_data = plot_df.groupby(x_axis).size().reset_index(name='count')
+            pie_data = self._value_counts(plot_df, x_axis).head(MAX_PIE_SLICES)
             
-            fig = px.pie(
+            fig = _px().pie(
                 pie_data,
                 names=x_axis,
                 values='count',
@@ -309,14 +625,21 @@ class ChartGenerator:
         """Create heatmap (correlation matrix of numeric columns)"""
         try:
             # Select only numeric columns for heatmap
-            numeric_df = self._prepare_data(df, df.columns.tolist(), numeric_only=True)
+            numeric_cols = spec.get('_numeric_cols')
+            if numeric_cols is not None:
+                cols = [col for col in df.columns if col in numeric_cols]
+                if len(cols) < 2:
+                    raise ValueError("Heatmap requires at least 2 numeric columns")
+                numeric_df = self._prepare_data(df, cols)
+            else:
+                numeric_df = self._prepare_data(df, df.columns.tolist(), numeric_only=True)
             
             if numeric_df.shape[1] < 2:
                 raise ValueError("Heatmap requires at least 2 numeric columns")
 
-            correlation_matrix = numeric_df.corr()
+            correlation_matrix = self._correlation_matrix(numeric_df)
 
-            fig = px.imshow(
+            fig = _px().imshow(
                 correlation_matrix,
                 title=spec.get('title', 'Correlation Heatmap'),
                 labels=dict(color='Correlation'),
@@ -327,6 +650,23 @@ class ChartGenerator:
 
         return fig
 
+    def _correlation_matrix(self, numeric_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Pearson correlation of numeric columns as one float32 matrix product (BLAS);
+        falls back to pandas' pairwise-complete .corr() when values are missing
+        """
+        values = numeric_df.to_numpy(dtype=np.float64)
+        if np.isnan(values).any():
+            return numeric_df.corr()
+
+        # Center in float64 so large offsets keep their precision, then multiply in float32
+        centered = np.ascontiguousarray(values - values.mean(axis=0), dtype=np.float32)
+        cov = centered.T @ centered
+        std = np.sqrt(np.diag(cov))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = np.clip(cov / np.outer(std, std), -1.0, 1.0)
+        return pd.DataFrame(corr, index=numeric_df.columns, columns=numeric_df.columns)
+
     def _create_area_chart(self, df: pd.DataFrame, spec: Dict[str, Any]) -> go.Figure:
         """Create area chart"""
         x_axis = spec.get('x_axis')
@@ -337,8 +677,9 @@ class ChartGenerator:
 
         try:
             plot_df = self._prepare_data(df, [x_axis, y_axis])
+            plot_df = self._maybe_downsample(plot_df, 'area', x_axis, y_axis)
             
-            fig = px.area(
+            fig = _px().area(
                 plot_df,
                 x=x_axis,
                 y=y_axis,
@@ -365,15 +706,18 @@ class ChartGenerator:
                 plot_df = self._ensure_numeric(plot_df, x_axis)
             
             # If still not numeric after all attempts, find first numeric column
-            if plot_df[x_axis].dtype not in ['int64', 'int32', 'float64', 'float32', 'int', 'float']:
-                numeric_cols = plot_df.select_dtypes(include=['number']).columns.tolist()
+            if not pd.api.types.is_numeric_dtype(plot_df[x_axis]):
+                if spec.get('_numeric_cols') is not None:
+                    numeric_cols = [col for col in plot_df.columns if col in spec['_numeric_cols']]
+                else:
+                    numeric_cols = plot_df.select_dtypes(include=['number']).columns.tolist()
                 if numeric_cols:
                     print(f"Warning: Column '{x_axis}' is not numeric. Using '{numeric_cols[0]}' instead")
                     x_axis = numeric_cols[0]
                 else:
                     raise ValueError(f"Column '{x_axis}' is not numeric and no numeric columns found in data")
             
-            fig = px.histogram(
+            fig = _px().histogram(
                 plot_df,
                 x=x_axis,
                 nbins=20,
@@ -399,7 +743,7 @@ class ChartGenerator:
             
             plot_df = self._prepare_data(df, cols_needed)
             
-            fig = px.box(
+            fig = _px().box(
                 plot_df,
                 x=x_axis if x_axis and x_axis in plot_df.columns else None,
                 y=y_axis,
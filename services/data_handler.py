@@ -1,106 +1,250 @@
+import asyncio
+import operator
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, Tuple
+import orjson
+import pyarrow as pa
+import pyarrow.json as pa_json
+from typing import BinaryIO, Callable, Dict, Any, Tuple, Union
 from io import BytesIO
 
+# Comparison operators supported in filters
+FILTER_OPS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
+def column_mask(col: pd.Series, op_func: Callable[[Any, Any], Any], value: Any) -> np.ndarray:
+    """
+    Boolean mask of `op_func(col, value)`, with missing results as False.
+    Categorical columns are compared once per category, then expanded by code.
+    """
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        per_category = np.asarray(op_func(col.cat.categories, value), dtype=bool)
+        # Code -1 (missing) picks the last entry: only != holds for a missing value
+        lookup = np.append(per_category, op_func is operator.ne)
+        return lookup[col.cat.codes.to_numpy()]
+    return op_func(col, value).to_numpy(dtype=bool, na_value=False)
+
 class DataHandler:
     """Handles data ingestion and validation"""
 
     def __init__(self):
         self.supported_formats = ['csv', 'json', 'xlsx']
 
-    async def load_data(self, file_content: bytes, file_type: str) -> pd.DataFrame:
-        """Load data from uploaded file"""
+    async def load_data(self, source: Union[bytes, BinaryIO], file_type: str) -> pd.DataFrame:
+        """Load data from uploaded file content or an open binary file"""
+        buffer = BytesIO(source) if isinstance(source, bytes) else source
+        # Parsing is CPU-bound; run it off the event loop
+        return await asyncio.to_thread(self._parse, buffer, file_type)
+
+    def _parse(self, buffer: BinaryIO, file_type: str) -> pd.DataFrame:
+        """Parse a file of the given type into a dataframe with downcast numeric columns"""
         try:
             if file_type == 'csv':
-                return pd.read_csv(BytesIO(file_content))
+                # pyarrow's reader parses blocks on multiple threads
+                df = pd.read_csv(buffer, engine='pyarrow')
             elif file_type == 'json':
-                return pd.read_json(BytesIO(file_content))
+                df = self._read_json(buffer)
             elif file_type == 'xlsx':
-                return pd.read_excel(BytesIO(file_content))
+                # calamine (Rust) is much faster than openpyxl for reading
+                df = pd.read_excel(buffer, engine='calamine')
             else:
                 raise ValueError(f"Unsupported file type: {file_type}")
         except Exception as e:
             raise ValueError(f"Error loading file: {str(e)}")
+        df = self._dates_to_datetime(df)
+        return self._categorize_strings(self._downcast_numeric(df))
+
+    def _read_json(self, buffer: BinaryIO) -> pd.DataFrame:
+        """Read a JSON document, or newline-delimited JSON records with pyarrow's multithreaded reader"""
+        start = buffer.tell()
+        try:
+            return pd.read_json(buffer)
+        except ValueError:
+            # pandas rejects NDJSON ("Trailing data"); retry it as one record per line
+            buffer.seek(start)
+            try:
+                return pa_json.read_json(buffer).to_pandas()
+            except pa.ArrowException:
+                pass
+            raise
+
+    def _dates_to_datetime(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Convert columns of datetime.date objects to datetime64. pyarrow reads
+        date-only values as date32, which pandas turns into object columns that
+        neither compare with ISO strings nor count as datetime columns.
+        """
+        for i, dtype in enumerate(df.dtypes):
+            if dtype != object:
+                continue
+            col = df.iloc[:, i]
+            if pd.api.types.infer_dtype(col, skipna=True) == 'date':
+                df.isetitem(i, pd.to_datetime(col))
+        return df
+
+    def _downcast_numeric(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Store numeric columns in the narrowest dtype that holds them exactly:
+        integers in the smallest integer type, floats as float32 when no value changes
+        """
+        for i, dtype in enumerate(df.dtypes):
+            col = df.iloc[:, i]
+            if pd.api.types.is_integer_dtype(dtype):
+                df.isetitem(i, pd.to_numeric(col, downcast='integer'))
+            elif dtype == np.float64:
+                values = col.to_numpy()
+                as_float32 = values.astype(np.float32)
+                if np.array_equal(as_float32, values, equal_nan=True):
+                    df.isetitem(i, as_float32)
+        return df
+
+    def _categorize_strings(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Store object columns with mostly repeated values as category, so
+        filters and group-bys work on integer codes instead of Python objects
+        """
+        for i, dtype in enumerate(df.dtypes):
+            if dtype != object:
+                continue
+            col = df.iloc[:, i]
+            try:
+                if col.nunique() < 0.5 * len(col):
+                    df.isetitem(i, col.astype('category'))
+            except TypeError:
+                # Unhashable values (e.g. nested JSON lists) stay as objects
+                continue
+        return df
 
     def validate_data(self, df: pd.DataFrame) -> Tuple[bool, str]:
         """Validate data structure and size"""
+        # Check for empty dataframe
+        if df.empty:
+            return False, "Data cannot be empty"
+
         # Check row count
-        if len(df) < 2:
+        rows = df.shape[0]
+        if rows < 2:
             return False, "Data must have at least 2 rows"
 
-        if len(df) > 100000:
+        if rows > 100000:
             return False, "Data exceeds maximum limit of 100,000 rows"
 
-        # Check for empty dataframe
-        if df.empty:
-            return False, "Data cannot be empty"
-
-        # Check for all null columns
-        if df.isnull().all().all():
+        # Check for all null columns (per-column non-null counts, no boolean frame)
+        if df.count().sum() == 0:
             return False, "All data is null"
 
         return True, "Data validated successfully"
 
-    def analyze_data_structure(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Analyze data types and structure for chart selection"""
-        numerical_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-        categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
-        datetime_cols = df.select_dtypes(include=['datetime64']).columns.tolist()
+    def analyze_data_structure(self, df: pd.DataFrame, full_describe: bool = False) -> Dict[str, Any]:
+        """
+        Analyze data types and structure for chart selection. Summary stats are
+        count/mean/std/min/max per numeric column; `full_describe` adds quartiles.
+        """
+        # One pass over the dtypes, bucketing by kind
+        numerical_cols, categorical_cols, datetime_cols = [], [], []
+        dtypes = {}
+        for col, dtype in df.dtypes.items():
+            dtypes[col] = str(dtype)
+            if dtype.kind in 'iufc':
+                numerical_cols.append(col)
+            elif dtype.kind == 'M':
+                datetime_cols.append(col)
+            else:
+                # object/string, bool and category columns
+                categorical_cols.append(col)
 
         metadata = {
             'columns': list(df.columns),
-            'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()},
+            'dtypes': dtypes,
             'numerical_columns': numerical_cols,
             'categorical_columns': categorical_cols,
             'datetime_columns': datetime_cols,
             'row_count': len(df),
             'column_count': len(df.columns),
-            'summary_stats': df.describe().to_dict(),
-            'null_counts': df.isnull().sum().to_dict(),
+            'summary_stats': self._summary_stats(df, numerical_cols, full_describe),
+            'null_counts': df.isna().sum().to_dict(),
+            # Column lists pre-serialized for the LLM prompt; internal, not part of the API
+            '_json': {
+                'columns': orjson.dumps(list(df.columns)).decode(),
+                'numerical_columns': orjson.dumps(numerical_cols).decode(),
+                'categorical_columns': orjson.dumps(categorical_cols).decode(),
+                'datetime_columns': orjson.dumps(datetime_cols).decode(),
+            },
         }
         return metadata
 
+    def _summary_stats(self, df: pd.DataFrame, numerical_cols: list, full_describe: bool) -> Dict[str, Any]:
+        """Per-column summary statistics, with O(N) numpy reductions unless quartiles are wanted"""
+        if full_describe or not numerical_cols:
+            # describe() falls back to object stats when there are no numeric columns
+            return (df[numerical_cols] if numerical_cols else df).describe().to_dict()
+
+        stats = {}
+        for col in numerical_cols:
+            values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            values = values[~np.isnan(values)]
+            count = len(values)
+            stats[col] = {
+                'count': float(count),
+                'mean': float(values.mean()) if count else np.nan,
+                'std': float(values.std(ddof=1)) if count > 1 else np.nan,
+                'min': float(values.min()) if count else np.nan,
+                'max': float(values.max()) if count else np.nan,
+            }
+        return stats
+
     def apply_filters(self, df: pd.DataFrame, filters: list) -> pd.DataFrame:
-        """Apply data filters to dataframe"""
+        """
+        Apply data filters to dataframe. Without filters `df` itself is
+        returned, so callers must not mutate the result in place.
+        """
         if not filters:
             return df
 
-        filtered_df = df.copy()
-
+        # Evaluate every predicate on the full frame, then index once
+        masks = []
         for filter_spec in filters:
             column = filter_spec.column
-            operator = filter_spec.operator
+            op = filter_spec.operator
             value = filter_spec.value
 
-            if column not in filtered_df.columns:
+            if column not in df.columns:
                 raise ValueError(f"Column {column} not found")
 
             try:
-                if operator == '==':
-                    filtered_df = filtered_df[filtered_df[column] == value]
-                elif operator == '>':
-                    filtered_df = filtered_df[filtered_df[column] > value]
-                elif operator == '<':
-                    filtered_df = filtered_df[filtered_df[column] < value]
-                elif operator == '>=':
-                    filtered_df = filtered_df[filtered_df[column] >= value]
-                elif operator == '<=':
-                    filtered_df = filtered_df[filtered_df[column] <= value]
-                elif operator == '!=':
-                    filtered_df = filtered_df[filtered_df[column] != value]
-                else:
-                    raise ValueError(f"Unsupported operator: {operator}")
+                op_func = FILTER_OPS.get(op)
+                if op_func is None:
+                    raise ValueError(f"Unsupported operator: {op}")
+                masks.append(column_mask(df[column], op_func, value))
             except Exception as e:
                 raise ValueError(f"Error applying filter: {str(e)}")
 
-        return filtered_df
+        return df[np.logical_and.reduce(masks)]
 
     def get_column_sample(self, df: pd.DataFrame, column: str, sample_size: int = 5) -> list:
         """Get sample values from a column"""
         if column not in df.columns:
             return []
-        return df[column].dropna().unique()[:sample_size].tolist()
+        col = df[column]
+        if col.dtype != object:
+            # Hash-based unique runs in C for typed columns
+            return col.dropna().unique()[:sample_size].tolist()
+
+        # Object columns: stop as soon as enough distinct values are seen
+        seen = {}
+        for value in col.to_numpy():
+            if len(seen) >= sample_size:
+                break
+            if value is None or value is pd.NA or value != value:  # missing (NaN/NaT != itself)
+                continue
+            seen[value] = None
+        return list(seen)
 
 # Singleton instance
 data_handler = DataHandler()
@@ -1,25 +1,80 @@
 import json
 import httpx
-from typing import Dict, Any
-
-class LLMHandler:
-    """Handles LLM interactions for chart specification generation (Ollama compatible)"""
-
-    def __init__(self, endpoint: str, api_key: str, model: str):
-        self.endpoint = endpoint.rstrip('/')
-        self.api_key = api_key  # Not required for Ollama, but kept for compatibility
-        self.model = model
-
-    def create_system_prompt(self, data_metadata: Dict[str, Any]) -> str:
-        """Create system prompt with data context"""
-        return f"""You are a data visualization expert. Given a user's natural language request and data metadata,
+import orjson
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Any
+
+_DECODER = json.JSONDecoder()
+
+# Filter operator spellings the LLM may use, normalized to the ones FilterSpec accepts
+_OP_MAP = {
+    '=': '==', '==': '==', 'equals': '==', 'is': '==',
+    '!=': '!=', 'neq': '!=', 'not equals': '!=',
+    '>': '>', '<': '<', '>=': '>=', '<=': '<='
+}
+
+# Where supported LLM envelopes keep the model output, in order of preference:
+# Ollama chat, OpenAI-style chat and completion choices, then bare keys
+_ENVELOPE_PATHS = (
+    ('message', 'content'),
+    ('choices', 0, 'message', 'content'),
+    ('choices', 0, 'text'),
+    ('choices', 0, 'content'),
+    ('content',),
+    ('text',),
+)
+
+# Alternative keys for filter fields, in order of preference
+_FILTER_COLUMN_KEYS = ('column', 'column_name', 'col', 'field')
+_FILTER_OPERATOR_KEYS = ('operator', 'op', 'relation', 'operator_symbol')
+_FILTER_VALUE_KEYS = ('value', 'val', 'v')
+
+def extract_json_from_text(text: str):
+    """Find and return the first valid JSON object or array in `text`.
+
+    Each '{' or '[' is tried in order with the decoder's raw_decode, which
+    parses one value with the C scanner and ignores whatever follows it.
+    """
+    if not text:
+        raise ValueError("Empty text from LLM response")
+
+    error = None
+    brace, bracket = text.find('{'), text.find('[')
+    while brace != -1 or bracket != -1:
+        if bracket == -1 or (brace != -1 and brace < bracket):
+            start, brace = brace, text.find('{', brace + 1)
+        else:
+            start, bracket = bracket, text.find('[', bracket + 1)
+        try:
+            return _DECODER.raw_decode(text, start)[0]
+        except json.JSONDecodeError as e:
+            # Keep the first error; it is the most useful one to report
+            error = error or e
+
+    if error is None:
+        raise ValueError("No JSON object or array found in LLM response")
+    raise error
+
+@lru_cache(maxsize=32)
+def _render_system_prompt(
+    columns: str,
+    numerical_columns: str,
+    categorical_columns: str,
+    datetime_columns: str,
+    row_count: int,
+) -> str:
+    """
+    System prompt for one dataset shape, from the column lists as JSON
+    strings; cached since every query on a session needs the same one
+    """
+    return f"""You are a data visualization expert. Given a user's natural language request and data metadata,
         generate a JSON specification for creating a chart.
 
-        Available data columns: {json.dumps(data_metadata['columns'])}
-        Numerical columns: {json.dumps(data_metadata['numerical_columns'])}
-        Categorical columns: {json.dumps(data_metadata['categorical_columns'])}
-        Datetime columns: {json.dumps(data_metadata['datetime_columns'])}
-        Row count: {data_metadata['row_count']}
+        Available data columns: {columns}
+        Numerical columns: {numerical_columns}
+        Categorical columns: {categorical_columns}
+        Datetime columns: {datetime_columns}
+        Row count: {row_count}
 
         CRITICAL INSTRUCTIONS (follow exactly):
         - Output MUST be exactly one valid JSON object (or JSON array if explicitly required) and nothing else.
@@ -56,7 +111,7 @@ class LLMHandler:
 
         Rules:
         1. Only use columns that exist in the data.
-        2. For "histogram", ALWAYS choose from numerical columns: {json.dumps(data_metadata['numerical_columns'])}.
+        2. For "histogram", ALWAYS choose from numerical columns: {numerical_columns}.
         3. For "line", "scatter", "area": choose numeric x_axis and numeric y_axis.
         4. For "pie", "bar": choose categorical or string x_axis.
         5. Match chart type to the data and user request.
@@ -64,6 +119,65 @@ class LLMHandler:
         7. Ensure all column names are valid and match exactly (case-sensitive).
         """
 
+def _extract_content(response_data: Any) -> str:
+    """Model output text from a response envelope or stream frame, or '' if there is none"""
+    for path in _ENVELOPE_PATHS:
+        node = response_data
+        for key in path:
+            try:
+                node = node[key]
+            except (KeyError, IndexError, TypeError):
+                break
+        else:
+            if isinstance(node, str) and node:
+                return node
+    return ''
+
+async def _aiter_byte_lines(response: httpx.Response) -> AsyncIterator[bytes]:
+    """Yield a streamed body line by line, as undecoded bytes"""
+    pending = b''
+    async for chunk in response.aiter_bytes():
+        *lines, pending = (pending + chunk).split(b'\n')
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+class LLMHandler:
+    """Handles LLM interactions for chart specification generation (Ollama compatible)"""
+
+    def __init__(self, endpoint: str, api_key: str, model: str):
+        self.endpoint = endpoint.rstrip('/')
+        self.api_key = api_key  # Not required for Ollama, but kept for compatibility
+        self.model = model
+        # One pooled client per handler so keep-alive connections are reused across requests;
+        # HTTP/2 is negotiated over TLS and multiplexes concurrent calls on one connection
+        self._client = httpx.AsyncClient(
+            base_url=self.endpoint,
+            http2=True,
+            timeout=40,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=60),
+        )
+
+    async def aclose(self) -> None:
+        """Close the pooled HTTP client"""
+        await self._client.aclose()
+
+    def create_system_prompt(self, data_metadata: Dict[str, Any]) -> str:
+        """Create system prompt with data context"""
+        # analyze_data_structure pre-serializes the column lists; older metadata may lack them
+        serialized = data_metadata.get('_json') or {
+            key: orjson.dumps(data_metadata[key]).decode()
+            for key in ('columns', 'numerical_columns', 'categorical_columns', 'datetime_columns')
+        }
+        return _render_system_prompt(
+            serialized['columns'],
+            serialized['numerical_columns'],
+            serialized['categorical_columns'],
+            serialized['datetime_columns'],
+            data_metadata['row_count'],
+        )
+
     async def parse_user_request(self, user_query: str, data_metadata: Dict[str, Any]) -> Dict[str, Any]:
         """Parse user query using Ollama and generate chart spec"""
         system_prompt = self.create_system_prompt(data_metadata)
@@ -71,109 +185,98 @@ class LLMHandler:
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_query}
         ]
-        url = f"{self.endpoint}/api/chat"
         payload = {
             "model": self.model,
             "messages": messages,
-            "stream": False 
+            "stream": True,
+            # Ollama's JSON mode (any version with /api/chat) constrains output to one JSON value;
+            # other servers ignore the field, and the extraction fallback below still applies
+            "format": "json"
         }
 
-        def extract_json_from_text(text: str):
-            """Find and return the first valid JSON object or array in `text`.
-
-            This scans for the first '{' or '[' and then balances braces/brackets
-            to locate the matching end. It returns the parsed Python object.
-            """
-            if not text:
-                raise ValueError("Empty text from LLM response")
-
-            # Find earliest opening brace or bracket
-            idx_brace = text.find('{')
-            idx_bracket = text.find('[')
-            candidates = [i for i in (idx_brace, idx_bracket) if i != -1]
-            if not candidates:
-                raise ValueError("No JSON object or array found in LLM response")
-
-            start_idx = min(candidates)
-            open_char = text[start_idx]
-            close_char = '}' if open_char == '{' else ']'
-
-            stack = []
-            end_idx = -1
-            for i in range(start_idx, len(text)):
-                ch = text[i]
-                if ch == '{' or ch == '[':
-                    stack.append(ch)
-                elif ch == '}' or ch == ']':
-                    if not stack:
-                        # unexpected closing
-                        raise ValueError('Malformed JSON: unexpected closing bracket')
-                    stack_pop = stack.pop()
-                    # optional sanity: ensure matching pairs
-                    if (stack_pop == '{' and ch != '}') or (stack_pop == '[' and ch != ']'):
-                        raise ValueError('Malformed JSON: mismatched brackets')
-                    if not stack:
-                        end_idx = i + 1
-                        break
-
-            if end_idx == -1:
-                raise ValueError("Malformed JSON: unbalanced brackets in LLM response")
-
-            json_str = text[start_idx:end_idx]
-            return json.loads(json_str)
-
         try:
-            async with httpx.AsyncClient(timeout=40) as client:
-                response = await client.post(url, json=payload)
+            # Leaving the block closes the stream, which stops generation on the server
+            async with self._client.stream(
+                "POST",
+                "/api/chat",
+                content=orjson.dumps(payload),
+                headers={"Content-Type": "application/json"},
+            ) as response:
                 response.raise_for_status()
-                # Try to parse the API envelope first; if that fails, fall back to raw text.
-                content = None
-                try:
-                    response_data = response.json()
-                except ValueError:
-                    # Not JSON (or streaming leftovers), use raw text
-                    raw = response.text
-                    content = raw.strip()
-                else:
-                    # Common possible places for model output (support multiple LLM envelopes)
-                    if isinstance(response_data, dict):
-                        # Ollama-style: {'message': {'content': '...'}}
-                        msg = response_data.get('message') or response_data.get('choices')
-                        if isinstance(msg, dict) and 'content' in msg:
-                            content = msg['content'].strip()
-                        elif isinstance(msg, list):
-                            # choices list or messages list
-                            parts = []
-                            for c in msg:
-                                if isinstance(c, dict):
-                                    # try message.content or text
-                                    if 'message' in c and isinstance(c['message'], dict) and 'content' in c['message']:
-                                        parts.append(c['message']['content'])
-                                    elif 'content' in c:
-                                        parts.append(c['content'])
-                                    elif 'text' in c:
-                                        parts.append(c['text'])
-                            content = '\n'.join([p for p in parts if p]).strip()
-                        else:
-                            # try other common keys
-                            content = response_data.get('content') or response_data.get('text') or ''
-                            content = (content or '').strip()
+                content = await self._read_content(response)
 
-                if not content:
-                    raise ValueError('Could not extract model output from response')
+            if not content:
+                raise ValueError('Could not extract model output from response')
 
+            try:
+                # In JSON mode the content is the spec itself; otherwise use the robust extraction
                 try:
-                    # Use the robust JSON extraction
+                    chart_spec_dict = orjson.loads(content)
+                except orjson.JSONDecodeError:
+                    chart_spec_dict = None
+                if not isinstance(chart_spec_dict, dict):
                     chart_spec_dict = extract_json_from_text(content)
-                    chart_spec = self.validate_and_enhance_spec(chart_spec_dict, data_metadata)
-                    return chart_spec
+                chart_spec = self.validate_and_enhance_spec(chart_spec_dict, data_metadata)
+                return chart_spec
 
-                except json.JSONDecodeError as e:
-                    raise ValueError(f"LLM returned invalid JSON: {str(e)}\nRaw content: {content}")
+            except json.JSONDecodeError as e:
+                raise ValueError(f"LLM returned invalid JSON: {str(e)}\nRaw content: {content}")
 
         except Exception as e:
             raise Exception(f"Error calling Ollama LLM: {str(e)}")
 
+    async def _read_content(self, response: httpx.Response) -> str:
+        """
+        Collect model output from a streamed chat response.
+
+        Ollama streams one JSON frame per line; frames are parsed straight
+        from the bytes with orjson, and reading stops as soon as the output
+        holds a complete JSON value. Bodies that are not line-framed JSON
+        (a single pretty-printed envelope, plain text) are read whole.
+        """
+        text = ''
+        start = -1
+        lines = []
+        framed = True
+        async for line in _aiter_byte_lines(response):
+            lines.append(line)
+            if not framed or not line.strip():
+                continue
+            try:
+                frame = orjson.loads(line)
+            except ValueError:
+                framed = False
+                continue
+            if isinstance(frame, dict) and frame.get('error'):
+                raise ValueError(f"LLM error: {frame['error']}")
+
+            piece = _extract_content(frame)
+            if not piece:
+                continue
+            text += piece
+            if start == -1:
+                starts = [i for i in (text.find('{'), text.find('[')) if i != -1]
+                start = min(starts, default=-1)
+            if start != -1 and ('}' in piece or ']' in piece):
+                try:
+                    _DECODER.raw_decode(text, start)
+                except json.JSONDecodeError:
+                    pass
+                else:
+                    # The spec is complete; skip the remaining tokens
+                    return text.strip()
+
+        if framed:
+            return text.strip()
+
+        # Try to parse the API envelope first; if that fails, fall back to raw text.
+        raw = b'\n'.join(lines)
+        try:
+            response_data = orjson.loads(raw)
+        except ValueError:
+            return raw.decode('utf-8', 'replace').strip()
+        return _extract_content(response_data).strip()
+
     def validate_and_enhance_spec(self, spec: Dict[str, Any], metadata: Dict[str, Any]) -> Dict[str, Any]:
         """Validate chart specification against available data"""
         try:
@@ -183,29 +286,21 @@ class LLMHandler:
             raw_filters = spec.get('filters')
             if isinstance(raw_filters, list):
                 normalized_filters = []
-                op_map = {
-                    '=': '==', '==': '==', 'equals': '==', 'is': '==',
-                    '!=': '!=', 'neq': '!=', 'not equals': '!=',
-                    '>': '>', '<': '<', '>=': '>=', '<=': '<='
-                }
+                # Case-insensitive column lookup; the first column wins on collisions
+                columns_by_lower = {}
+                for c in all_columns:
+                    columns_by_lower.setdefault(str(c).lower(), c)
 
                 for f in raw_filters:
                     if not isinstance(f, dict):
                         continue
-                    col = f.get('column') or f.get('column_name') or f.get('col') or f.get('field')
-                    op = f.get('operator') or f.get('op') or f.get('relation') or f.get('operator_symbol')
-                    if 'value' in f:
-                        val = f.get('value')
-                    elif 'val' in f:
-                        val = f.get('val')
-                    elif 'v' in f:
-                        val = f.get('v')
-                    else:
-                        val = None
+                    col = next((f[k] for k in _FILTER_COLUMN_KEYS if f.get(k)), None)
+                    op = next((f[k] for k in _FILTER_OPERATOR_KEYS if f.get(k)), None)
+                    val = next((f[k] for k in _FILTER_VALUE_KEYS if k in f), None)
 
                     if isinstance(op, str):
                         op_clean = op.strip().lower()
-                        op_norm = op_map.get(op_clean, op_clean)
+                        op_norm = _OP_MAP.get(op_clean, op_clean)
                     else:
                         op_norm = op
 
@@ -214,12 +309,10 @@ class LLMHandler:
                         if col in all_columns:
                             normalized_filters.append({'column': col, 'operator': op_norm, 'value': val})
                         else:
-                            matches = [c for c in all_columns if c.lower() == str(col).lower()]
-                            if matches:
-                                normalized_filters.append({'column': matches[0], 'operator': op_norm, 'value': val})
-                            else:
-                                # skip filters that reference non-existent columns
-                                continue
+                            match = columns_by_lower.get(str(col).lower())
+                            if match is not None:
+                                normalized_filters.append({'column': match, 'operator': op_norm, 'value': val})
+                            # otherwise skip filters that reference non-existent columns
 
                 spec['filters'] = normalized_filters
 
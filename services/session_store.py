@@ -0,0 +1,173 @@
+import asyncio
+import uuid
+import orjson
+import pandas as pd
+import pyarrow as pa
+from cachetools import LRUCache
+from typing import Any, Dict, Optional
+
+def _stringify_mixed_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast columns Arrow cannot convert (mixed-type objects or categories) to strings, keeping nulls"""
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        try:
+            pa.array(col)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            as_str = col.astype(object).where(col.isna(), col.astype(str))
+            if isinstance(col.dtype, pd.CategoricalDtype):
+                as_str = as_str.astype('category')
+            df.isetitem(i, as_str)
+    return df
+
+def _serialize_dataframe(df: pd.DataFrame) -> bytes:
+    """Serialize a dataframe to Arrow IPC stream bytes (column names become strings)"""
+    df = df.rename(columns=str)
+    try:
+        table = pa.Table.from_pandas(df)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Rare: only then check column by column
+        table = pa.Table.from_pandas(_stringify_mixed_columns(df))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def _deserialize_dataframe(data: bytes) -> pd.DataFrame:
+    """Rebuild a dataframe from Arrow IPC stream bytes"""
+    return pa.ipc.open_stream(data).read_all().to_pandas()
+
+class SessionStore:
+    """
+    Stores uploaded sessions (dataframe, filename, metadata, ...).
+
+    Sessions live in process memory by default. After connect() with a Redis
+    URL they are kept in Redis, so every worker sees them: metadata in a hash,
+    the dataframe as Arrow IPC bytes, generated chart specs in a second hash. A small per-process LRU keeps hot
+    sessions hydrated, checked against a version stamp on each read.
+    """
+
+    def __init__(self, ttl: int, local_cache_size: int = 8):
+        self.ttl = ttl
+        self.local_cache_size = local_cache_size
+        self._redis = None
+        self._local: Dict[str, Dict[str, Any]] = {}
+
+    async def connect(self, redis_url: str) -> None:
+        """Switch to Redis-backed storage; no-op when `redis_url` is empty"""
+        if not redis_url:
+            return
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(redis_url)
+        await self._redis.ping()
+        self._local = LRUCache(maxsize=self.local_cache_size)
+
+    async def close(self) -> None:
+        """Close the Redis connection pool, if any"""
+        if self._redis is not None:
+            await self._redis.aclose()
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return the session, or None if it does not exist"""
+        if self._redis is None:
+            return self._local.get(session_id)
+
+        key = f"session:{session_id}"
+        version = await self._redis.hget(key, 'version')
+        if version is None:
+            self._local.pop(session_id, None)
+            return None
+
+        cached = self._local.get(session_id)
+        if cached is not None and cached['_version'] == version:
+            return cached
+
+        # Read metadata and frame in one transaction, so a concurrent re-upload
+        # cannot pair the new frame with the old metadata
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(key)
+            pipe.get(f"{key}:dataframe")
+            fields, data = await pipe.execute()
+        if not fields or data is None:
+            self._local.pop(session_id, None)
+            return None
+
+        metadata = orjson.loads(fields[b'metadata'])
+        df = await asyncio.to_thread(_deserialize_dataframe, data)
+        # Arrow stores column names as strings; restore the originals
+        df.columns = metadata['columns']
+        session = {
+            'dataframe': df,
+            'filename': fields[b'filename'].decode(),
+            'metadata': metadata,
+            'metadata_hash': fields[b'metadata_hash'].decode(),
+            'numeric_cols': frozenset(orjson.loads(fields[b'numeric_cols'])),
+            '_version': fields[b'version'],
+        }
+        self._local[session_id] = session
+        return session
+
+    async def exists(self, session_id: str) -> bool:
+        """Whether the session exists, without loading its dataframe"""
+        if self._redis is None:
+            return session_id in self._local
+        return await self._redis.hexists(f"session:{session_id}", 'version')
+
+    async def set(self, session_id: str, session: Dict[str, Any]) -> None:
+        """Create or replace a session"""
+        if self._redis is None:
+            self._local[session_id] = session
+            return
+
+        key = f"session:{session_id}"
+        version = uuid.uuid4().hex.encode()
+        data = await asyncio.to_thread(_serialize_dataframe, session['dataframe'])
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key, f"{key}:charts")
+            pipe.hset(key, mapping={
+                'filename': session['filename'],
+                'metadata': orjson.dumps(
+                    session['metadata'],
+                    default=str,
+                    option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+                ),
+                'metadata_hash': session['metadata_hash'],
+                'numeric_cols': orjson.dumps(list(session['numeric_cols'])),
+                'version': version,
+            })
+            pipe.set(f"{key}:dataframe", data)
+            pipe.expire(key, self.ttl)
+            pipe.expire(f"{key}:dataframe", self.ttl)
+            await pipe.execute()
+        self._local[session_id] = {**session, '_version': version}
+
+    async def delete(self, session_id: str) -> bool:
+        """Delete a session; returns False if it did not exist"""
+        existed = self._local.pop(session_id, None) is not None
+        if self._redis is not None:
+            key = f"session:{session_id}"
+            existed = await self._redis.delete(key, f"{key}:dataframe", f"{key}:charts") > 0
+        return existed
+
+    async def add_chart(self, session_id: str, chart_id: str, chart_spec: Dict[str, Any]) -> None:
+        """Remember the spec behind a generated chart, so any worker can render it again"""
+        if self._redis is None:
+            session = self._local.get(session_id)
+            if session is not None:
+                session.setdefault('charts', {})[chart_id] = chart_spec
+            return
+
+        key = f"session:{session_id}:charts"
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, chart_id, orjson.dumps(chart_spec))
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def get_chart(self, session_id: str, chart_id: str) -> Optional[Dict[str, Any]]:
+        """Spec of a chart generated for the session, or None if unknown"""
+        if self._redis is None:
+            session = self._local.get(session_id)
+            return (session or {}).get('charts', {}).get(chart_id)
+
+        data = await self._redis.hget(f"session:{session_id}:charts", chart_id)
+        return orjson.loads(data) if data is not None else None